@@ -3,6 +3,7 @@ import sys
 import csv
 import os
 import re
+import time
 import boto3
 from botocore.config import Config
 from strands import Agent, tool
@@ -150,48 +151,140 @@ def get_bedrock_model(model_name: str) -> BedrockModel:
     )
 
 
+def _get_source_uri(result: dict) -> str:
+    """Extract the S3 source URI from a retrieval result."""
+    location = result.get("location", {})
+    if "s3Location" in location:
+        return location["s3Location"].get("uri", "")
+    return ""
+
+
+def _retrieve(query: str, number_of_results: int) -> list:
+    """Run a single Knowledge Base retrieval with the given number of results."""
+    # Build retrieval configuration with reranking
+    retrieval_config = {
+        "vectorSearchConfiguration": {
+            "numberOfResults": number_of_results,
+            "overrideSearchType": "HYBRID"
+            # "rerankingConfiguration": {
+            #     "type": "BEDROCK_RERANKING_MODEL",
+            #     "bedrockRerankingConfiguration": {
+            #         "modelConfiguration": {
+            #             "modelArn": config.RERANKER_MODEL_ARN
+            #         },
+            #         "numberOfRerankedResults": config.RAG_NUMBER_OF_RERANKED_RESULTS
+            #     }
+            # }
+        }
+    }
+
+    response = bedrock_agent_runtime.retrieve(
+        knowledgeBaseId=config.KNOWLEDGE_BASE_ID,
+        retrievalQuery={"text": query},
+        retrievalConfiguration=retrieval_config
+    )
+
+    return response.get("retrievalResults", [])
+
+
+def _normalize_question_type(question_type: str) -> str:
+    """Map a free-text question type to its configured name, or return an empty string."""
+    normalized = question_type.strip().lower()
+    if not normalized:
+        return ""
+    for name in config.RAG_MAX_RESULTS_BY_QUESTION_TYPE:
+        if name.lower() == normalized:
+            return name
+    logger.warning(f"Unrecognized question type: {question_type!r}, using default retrieval limit")
+    return ""
+
+
+def _get_weak_signal(results: list, question_type: str) -> str:
+    """
+    Check whether a prefix of the ranked results is too weak to stop at.
+
+    Returns the reason to widen the prefix, or an empty string if the results are sufficient.
+    """
+    scores = [result.get("score", 0) for result in results]
+    top_score = max(scores)
+
+    # Near-equal scores only matter when the best match is itself marginal
+    if len(results) > 1 and top_score < config.RAG_FLAT_SCORE_MAX_TOP_SCORE:
+        spread = top_score - min(scores)
+        if spread < config.RAG_MIN_SCORE_SPREAD:
+            return f"flat score distribution (spread {spread:.4f})"
+
+    min_sources = config.RAG_MIN_SOURCES_BY_QUESTION_TYPE.get(question_type, 1)
+    sources = {_get_source_uri(result) for result in results}
+    if len(sources) < min_sources:
+        return f"low source coverage ({len(sources)}/{min_sources})"
+
+    return ""
+
+
+def _select_results(results: list, max_results: int, question_type: str) -> tuple:
+    """
+    Choose the smallest prefix of the ranked results that is strong enough to answer from.
+
+    Returns the selected results and the weak signal left at the final prefix, if any.
+    """
+    if not results:
+        return results, ""
+
+    # Widening cannot raise the top score, so a weak best match takes the full list at once
+    top_score = max(result.get("score", 0) for result in results)
+    if top_score < config.RAG_MIN_TOP_SCORE:
+        return results, f"low top score ({top_score:.4f})"
+
+    number_of_results = min(config.RAG_INITIAL_NUMBER_OF_RESULTS, max_results)
+    while True:
+        selected = results[:number_of_results]
+        weak_signal = _get_weak_signal(selected, question_type)
+        # Stop at the cap or once the ranked list is exhausted
+        if not weak_signal or number_of_results >= min(max_results, len(results)):
+            return selected, weak_signal
+        logger.info(f"Widening retrieval from k={number_of_results}: {weak_signal}")
+        number_of_results = min(number_of_results * 2, max_results)
+
+
 @tool
-def retrieve_from_knowledge_base(query: str) -> str:
+def retrieve_from_knowledge_base(query: str, question_type: str = "") -> str:
     """
     Retrieve relevant information from the Bedrock Knowledge Base with reranking.
 
     This tool searches the pharma SOP knowledge base and returns relevant document chunks
     that can help answer questions about pharmaceutical procedures, regulations, and guidelines.
+    Only as many of the top results as needed are returned, up to a limit that depends
+    on the question type.
 
     Args:
         query: The search query to find relevant SOP information
+        question_type: The question type, one of "Fact Retrieval", "Summary", "Definition",
+            "Comparison", "Conditional", "Location", "Yes/No"
 
     Returns:
         Retrieved and reranked document chunks with source information
     """
     if not config.KNOWLEDGE_BASE_ID:
         return "Error: Knowledge Base ID is not configured. Please set the KNOWLEDGE_BASE_ID environment variable."
-        
-    try:
-        # Build retrieval configuration with reranking
-        retrieval_config = {
-            "vectorSearchConfiguration": {
-                "numberOfResults": config.RAG_NUMBER_OF_RESULTS,
-                "overrideSearchType": "HYBRID"
-                # "rerankingConfiguration": {
-                #     "type": "BEDROCK_RERANKING_MODEL",
-                #     "bedrockRerankingConfiguration": {
-                #         "modelConfiguration": {
-                #             "modelArn": config.RERANKER_MODEL_ARN
-                #         },
-                #         "numberOfRerankedResults": config.RAG_NUMBER_OF_RERANKED_RESULTS
-                #     }
-                # }
-            }
-        }
 
-        response = bedrock_agent_runtime.retrieve(
-            knowledgeBaseId=config.KNOWLEDGE_BASE_ID,
-            retrievalQuery={"text": query},
-            retrievalConfiguration=retrieval_config
+    question_type = _normalize_question_type(question_type)
+    max_results = config.RAG_MAX_RESULTS_BY_QUESTION_TYPE.get(question_type, config.RAG_NUMBER_OF_RESULTS)
+    start_time = time.perf_counter()
+
+    def log_stats(fetched: list, selected: list, outcome: str):
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        selected_chars = sum(len(result.get("content", {}).get("text", "")) for result in selected)
+        logger.info(
+            f"Retrieval stats | question_type={question_type or 'unknown'} max_k={max_results} "
+            f"fetched={len(fetched)} k={len(selected)} chars={selected_chars} "
+            f"latency_ms={latency_ms:.0f} outcome={outcome}"
         )
 
-        results = response.get("retrievalResults", [])
+    try:
+        fetched = _retrieve(query, max_results)
+        results, weak_signal = _select_results(fetched, max_results, question_type)
+        log_stats(fetched, results, f"weak_signal={weak_signal}" if weak_signal else "ok")
 
         if not results:
             return "No relevant information found in the knowledge base for the given query."
@@ -201,12 +294,11 @@ def retrieve_from_knowledge_base(query: str) -> str:
         for i, result in enumerate(results, 1):
             content = result.get("content", {}).get("text", "")
             score = result.get("score", 0)
-            location = result.get("location", {})
 
             # Extract source information
             source_info = ""
-            if "s3Location" in location:
-                uri = location["s3Location"].get("uri", "")
+            uri = _get_source_uri(result)
+            if uri:
                 source_info = f"Source: {uri}"
 
             formatted_results.append(
@@ -218,6 +310,7 @@ def retrieve_from_knowledge_base(query: str) -> str:
         return "\n\n---\n\n".join(formatted_results)
 
     except Exception as e:
+        log_stats([], [], "error")
         logger.error(f"Error retrieving from knowledge base: {e}")
         return f"Error retrieving from knowledge base: {str(e)}"
 
@@ -235,6 +328,7 @@ def create_sop_agent(model_name: str = "Claude Sonnet 4.5") -> Agent:
 
 답변 가이드라인:
 - 질문에 관련 용어(영문명, 국문명)가 함께 제공될 수 있습니다. 이 용어들을 활용하여 retrieve_from_knowledge_base 도구로 검색하세요.
+- retrieve_from_knowledge_base 호출 시 아래 질문 유형 중 하나를 question_type으로 함께 전달하세요.
 - 검색된 정보를 바탕으로 명확하고 구조화된 답변을 제공하세요.
 - SOP 문서 번호, 섹션, 버전 등을 정확히 인용하세요.
 - 불확실한 정보는 추측하지 말고, 추가 확인이 필요하다고 안내하세요.
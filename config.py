@@ -35,3 +35,32 @@ DYNAMODB_TABLE_NAME = os.getenv("DYNAMODB_TABLE_NAME", "user_feedback")
 # RAG Configuration
 RAG_NUMBER_OF_RESULTS = 10
 RAG_NUMBER_OF_RERANKED_RESULTS = 5
+
+# Adaptive Retrieval Configuration
+# The Knowledge Base is queried once with the per-question-type cap, then only the smallest
+# prefix of the ranked list (starting at RAG_INITIAL_NUMBER_OF_RESULTS, doubling) that passes
+# the checks below is passed to the model. Unknown question types fall back to RAG_NUMBER_OF_RESULTS.
+RAG_INITIAL_NUMBER_OF_RESULTS = 3
+RAG_MAX_RESULTS_BY_QUESTION_TYPE = {
+    "Fact Retrieval": 6,
+    "Summary": 10,
+    "Definition": 5,
+    "Comparison": 10,
+    "Conditional": 10,
+    "Location": 5,
+    "Yes/No": 5,
+}
+# Score thresholds assume Knowledge Base relevance scores in the 0-1 range (higher is more
+# relevant). They are starting values and have not been calibrated against HYBRID search scores.
+# Use the full capped list when the top score is below this value
+RAG_MIN_TOP_SCORE = 0.5
+# Widen when the scores are too flat to single out a clear best match (top - last),
+# but only while the top score is still marginal (below RAG_FLAT_SCORE_MAX_TOP_SCORE)
+RAG_MIN_SCORE_SPREAD = 0.05
+RAG_FLAT_SCORE_MAX_TOP_SCORE = 0.7
+# Widen until results cover at least this many distinct source documents
+RAG_MIN_SOURCES_BY_QUESTION_TYPE = {
+    "Comparison": 2,
+    "Summary": 2,
+    "Conditional": 2,
+}